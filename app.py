@@ -1,36 +1,205 @@
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 import joblib
-import pandas as pd
+import lightgbm as lgb
+import numpy as np
+import orjson
 import os
+import queue
+import threading
+
+class OrjsonProvider(JSONProvider):
+    """Serves Flask's JSON (jsonify, get_json) with orjson instead of the stdlib json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response, skipping the str round trip in dumps
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
 
 # Initialize the Flask application
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 # Final version for deployment
 
+# Written by export_onnx.py; when present, predictions are served with ONNX Runtime
+ONNX_MODEL_PATH = 'lgbm_model.onnx'
+
+# --- Model Preparation ---
+def fold_scaler_into_booster(booster, mean, scale):
+    """Returns a copy of the booster whose split thresholds apply to unscaled features.
+
+    Each tree tests (x - mean) / scale <= t, which is the same as x <= t * scale + mean
+    because scale is positive, so the StandardScaler can be baked into the thresholds.
+    """
+    lines = booster.model_to_string().split('\n')
+    trees = []
+    for i, line in enumerate(lines):
+        key, _, value = line.partition('=')
+        if key == 'Tree':
+            trees.append({})
+        elif trees and key in ('split_feature', 'threshold', 'decision_type'):
+            trees[-1][key] = (i, value.split())
+
+    for tree in trees:
+        if 'threshold' not in tree:
+            continue  # single-leaf tree, nothing to fold
+        i, thresholds = tree['threshold']
+        features = [int(f) for f in tree['split_feature'][1]]
+        decisions = [int(d) for d in tree['decision_type'][1]]
+        folded = []
+        for feature, threshold, decision in zip(features, thresholds, decisions):
+            # Bit 0 marks a categorical split; bits 2-3 hold the missing type (1 = zero as missing)
+            if decision & 1 or (decision >> 2) & 3 == 1:
+                raise ValueError('Cannot fold the scaler into categorical or zero-as-missing splits.')
+            folded.append(repr(float(threshold) * float(scale[feature]) + float(mean[feature])))
+        lines[i] = 'threshold=' + ' '.join(folded)
+
+    # tree_sizes records each tree's length in bytes, which no longer holds after
+    # rewriting the thresholds; without it LightGBM parses the trees sequentially.
+    lines = [line for line in lines if not line.startswith('tree_sizes=')]
+    return lgb.Booster(model_str='\n'.join(lines))
+
 # --- Load All Model Assets ---
 try:
     model = joblib.load('lgbm_model.joblib')
-    scaler = joblib.load('scaler.joblib')
-    training_columns = joblib.load('training_columns.joblib')
+    # Memory-map the numpy-backed assets so their pages are shared across workers
+    scaler = joblib.load('scaler.joblib', mmap_mode='r')
+    training_columns = tuple(joblib.load('training_columns.joblib', mmap_mode='r'))
+    # Raw features go straight to the booster; no scaling pass at request time
+    booster = fold_scaler_into_booster(model.booster_, scaler.mean_, scaler.scale_)
     print("✅ Model, scaler, and training columns loaded successfully!")
 except FileNotFoundError as e:
     print(f"🔴 CRITICAL ERROR: Could not find a required model file. {e}")
-    model, scaler, training_columns = None, None, None
+    model, scaler, training_columns, booster = None, None, None, None
 except Exception as e:
     print(f"🔴 An unexpected error occurred while loading model assets: {e}")
-    model, scaler, training_columns = None, None, None
+    model, scaler, training_columns, booster = None, None, None, None
+
+# Computed once so the request path does not re-check every asset
+ASSETS_READY = model is not None and scaler is not None and training_columns is not None
+N_COLS = len(training_columns) if ASSETS_READY else 0
+# Lets column-keyed payloads be checked for missing features with one set difference
+_COL_SET = frozenset(training_columns) if ASSETS_READY else frozenset()
+
+# --- Optional ONNX Runtime Model ---
+# Set by _load_onnx_session in each worker process. ONNX Runtime is not fork-safe,
+# so it is never imported, nor a session created, in the preloaded gunicorn master.
+onnx_session = None
+_io_binding = None
+
+def _load_onnx_session():
+    """Loads the exported ONNX model, if there is one, for this process's batch worker."""
+    global onnx_session, _io_binding
+    if not os.path.exists(ONNX_MODEL_PATH):
+        return
+    try:
+        import onnxruntime as ort
+        sess_options = ort.SessionOptions()
+        # Each gunicorn worker scores one batch at a time; we scale out with workers, not threads
+        sess_options.intra_op_num_threads = 1
+        sess_options.inter_op_num_threads = 1
+        onnx_session = ort.InferenceSession(ONNX_MODEL_PATH, sess_options, providers=['CPUExecutionProvider'])
+        # Only the batch worker thread runs the session, so a single binding is reused for every batch
+        _io_binding = onnx_session.io_binding()
+        print("✅ ONNX model loaded; predictions will be served with ONNX Runtime.")
+    except Exception as e:
+        print(f"🔴 Could not load the ONNX model, falling back to LightGBM: {e}")
+        onnx_session, _io_binding = None, None
+
+# --- Micro-Batching Settings ---
+# Requests that queue up while a batch is being scored are scored together in the
+# next model call, up to BATCH_SIZE rows per call. BATCH_TIMEOUT_MS is how long to
+# linger for more rows once the queue is empty; at 0 a lone request is scored at once.
+BATCH_SIZE = int(os.environ.get('BATCH_SIZE', 32))
+BATCH_TIMEOUT_MS = float(os.environ.get('BATCH_TIMEOUT_MS', 0))
+# Maximum time a request waits for its batch to be scored before giving up.
+PREDICT_TIMEOUT_S = float(os.environ.get('PREDICT_TIMEOUT_S', 10))
 
 # --- Scorecard Function ---
-def probability_to_score(prob_of_default):
-    """Converts probability to a 300-900 score."""
-    score = 300 + (600 * (1 - prob_of_default))
-    return int(score)
+def probability_to_score(probs: np.ndarray) -> np.ndarray:
+    """Converts an array of default probabilities to 300-900 scores."""
+    # astype truncates toward zero, matching the previous int() conversion
+    return (300 + 600 * (1 - probs)).astype(np.int32)
+
+# --- Batch Worker ---
+# Created by _get_batch_queue in the process that serves requests, not at import
+_batch_queue = None
+_batch_pid = None
+_batch_lock = threading.Lock()
+
+def _predict_default_proba(rows):
+    """Returns the probability of default for each row of raw features."""
+    # Before the fold, scaler.transform kept NaN and the trees read it as scaled 0,
+    # i.e. the column mean; the raw-feature backends would read it as 0 instead.
+    rows = np.where(np.isnan(rows), scaler.mean_, rows)
+    if onnx_session is not None:
+        # The exported graph applies the scaler itself, in float32, ahead of the original trees
+        _io_binding.bind_cpu_input('input', rows.astype(np.float32))
+        # Rebind the output each time so ONNX Runtime allocates it for this batch's size
+        _io_binding.bind_output('probabilities')
+        onnx_session.run_with_iobinding(_io_binding)
+        return _io_binding.copy_outputs_to_cpu()[0][:, 1]
+    # A batch is too small to benefit from OpenMP, and gunicorn already runs a worker
+    # per core; extra threads per call would only oversubscribe the CPU.
+    raw = booster.predict(rows, raw_score=True, num_threads=1)
+    return 1.0 / (1.0 + np.exp(-raw))
+
+def _batch_worker(batch_queue):
+    """Collects queued rows into batches and scores each batch with one model call."""
+    _load_onnx_session()
+    timeout = BATCH_TIMEOUT_MS / 1000
+    while True:
+        batch = [batch_queue.get()]
+        try:
+            while len(batch) < BATCH_SIZE:
+                if timeout > 0:
+                    batch.append(batch_queue.get(timeout=timeout))
+                else:
+                    batch.append(batch_queue.get_nowait())
+        except queue.Empty:
+            pass
+
+        try:
+            rows = np.vstack([row for row, _, _ in batch])
+            probs = _predict_default_proba(rows)
+            scores = probability_to_score(probs)
+            for (_, done, result_box), prob, score in zip(batch, probs, scores):
+                result_box['prob'] = prob
+                result_box['score'] = score
+                done.set()
+        except Exception as e:
+            for _, done, result_box in batch:
+                result_box['error'] = e
+                done.set()
+
+def _get_batch_queue():
+    """Returns this process's batch queue, starting its worker thread on first use.
+
+    Under `gunicorn --preload` this module is imported once in the master, which
+    never serves requests, and then forked; threads do not survive a fork, so each
+    worker starts its own queue and thread when its first request arrives.
+    """
+    global _batch_queue, _batch_pid
+    pid = os.getpid()
+    if _batch_pid != pid:
+        with _batch_lock:
+            if _batch_pid != pid:
+                _batch_queue = queue.Queue()
+                threading.Thread(target=_batch_worker, args=(_batch_queue,), name='batch-worker', daemon=True).start()
+                _batch_pid = pid
+    return _batch_queue
 
 # --- API Endpoints ---
 @app.route('/status', methods=['GET'])
 def status():
     """A simple endpoint to check if the API is running."""
-    if model and scaler and training_columns:
+    if ASSETS_READY:
         return jsonify({'status': 'ok', 'message': 'API is online and all assets are loaded.'})
     else:
         return jsonify({'status': 'error', 'message': 'API is running, but some assets failed to load.'}), 500
@@ -38,25 +207,55 @@ def status():
 @app.route('/predict', methods=['POST'])
 def predict():
     """The main endpoint to make credit score predictions."""
-    if not all([model, scaler, training_columns]):
+    if not ASSETS_READY:
         return jsonify({'error': 'Model is not loaded properly. Cannot make predictions.'}), 500
 
     try:
-        data = request.get_json()
-        input_df = pd.DataFrame(data, index=[0])
-        input_df_reordered = input_df[training_columns]
-        input_scaled = scaler.transform(input_df_reordered)
-        prob_default = model.predict_proba(input_scaled)[:, 1][0]
-        credit_score = probability_to_score(prob_default)
-        
+        try:
+            data = orjson.loads(request.get_data())
+        except orjson.JSONDecodeError:
+            return jsonify({'error': 'Request body is not valid JSON.'}), 400
+        if not isinstance(data, dict):
+            return jsonify({'error': 'Request body must be a JSON object.'}), 400
+
+        # Rows stay float64: the folded thresholds sit right next to values that occur
+        # exactly in the training data (e.g. mean-imputed ones), and float32 rounding
+        # would push those values across the split.
+        if 'features' in data:
+            # Positional payload: {"features": [...]} already in training-column order
+            try:
+                row = np.asarray(data['features'], dtype=np.float64).reshape(1, -1)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Features must be numbers.'}), 400
+            if row.shape[1] != N_COLS:
+                return jsonify({'error': f'Expected {N_COLS} features, got {row.shape[1]}.'}), 400
+        else:
+            # Legacy payload keyed by column name; every training column must be present
+            missing = _COL_SET.difference(data)
+            if missing:
+                return jsonify({'error': f'Missing {len(missing)} features, e.g. {sorted(missing)[:5]}.'}), 400
+            row = np.empty((1, N_COLS), dtype=np.float64)
+            try:
+                for i, col in enumerate(training_columns):
+                    row[0, i] = data[col]
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Features must be numbers.'}), 400
+
+        # null features are scored as missing (NaN), but infinities cannot be scaled
+        if np.isinf(row).any():
+            return jsonify({'error': 'Features must be finite numbers.'}), 400
+
+        done, result_box = threading.Event(), {}
+        _get_batch_queue().put((row, done, result_box))
+        if not done.wait(timeout=PREDICT_TIMEOUT_S):
+            return jsonify({'error': 'Prediction timed out. Please try again.'}), 504
+        if 'error' in result_box:
+            raise result_box['error']
+
         return jsonify({
-            'probability_of_default': float(prob_default),
-            'credit_score': credit_score
+            'probability_of_default': float(result_box['prob']),
+            'credit_score': int(result_box['score'])
         })
     except Exception as e:
         print(f"🔴 Prediction Error: {e}")
         return jsonify({'error': f'Prediction failed: {e}'}), 500
-
-if __name__ == '__main__':
-    # --- THE FIX: Disable the reloader to prevent timeouts ---
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
@@ -1,9 +1,15 @@
 import streamlit as st
-import requests
+import httpx
 import pandas as pd
+import numpy as np
 import joblib
-import os
-from fpdf import FPDF
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
 
 # --- Configuration & Setup ---
 # The API_URL now points to your live Render service
@@ -16,124 +22,193 @@ COLUMNS_PATH = "training_columns.joblib"
 @st.cache_resource(show_spinner="Loading model assets...")
 def load_training_columns(path: str) -> list:
     """Loads the list of column names the model was trained on."""
-    if not os.path.exists(path):
+    try:
+        return joblib.load(path, mmap_mode='r')
+    except FileNotFoundError:
         st.error(f"Error: The required file '{path}' was not found. Please run the notebook to create it.")
         st.stop()
-    return joblib.load(path)
+
+@st.cache_resource
+def load_column_index(path: str) -> dict:
+    """Maps each training column name to its position in the feature vector."""
+    return {col: i for i, col in enumerate(load_training_columns(path))}
+
+@st.cache_resource
+def get_client() -> httpx.Client:
+    """Creates one pooled HTTP client so API connections are kept alive across reruns."""
+    # Fail fast when the API host is unreachable, but leave room in the read timeout
+    # for a Render instance waking from sleep.
+    timeout = httpx.Timeout(connect=3.0, read=30.0, write=5.0, pool=5.0)
+    return httpx.Client(base_url=API_URL, timeout=timeout)
+
+@st.cache_resource
+def get_pdf_executor() -> ThreadPoolExecutor:
+    """Creates the thread pool that builds PDF reports off the rendering path."""
+    return ThreadPoolExecutor(max_workers=2)
 
 # Load the columns once at the start
 training_columns = load_training_columns(COLUMNS_PATH)
+COL_IDX = load_column_index(COLUMNS_PATH)
 
 # --- Helper Functions ---
 
-def get_rejection_analysis_and_suggestions(inputs: dict) -> tuple[list, list]:
+# (reason, suggestion) shown for each rejection check that applies
+REASON_TEMPLATES = {
+    'low_cibil': (
+        "Low CIBIL Score",
+        "Improve your CIBIL score by paying all existing bills and EMIs on time without any delays.",
+    ),
+    'high_dti': (
+        "High Debt-to-Income Ratio",
+        "The proposed monthly payment is high for your current income. Consider reducing the loan amount or extending the loan tenure to lower the EMI.",
+    ),
+    'short_employment': (
+        "Short Employment History",
+        "Lenders prefer applicants with a stable employment history of at least 1-2 years. Building a longer track record at your current job will help.",
+    ),
+    'many_loans': (
+        "High Number of Existing Loans",
+        "Having multiple active loans can indicate high financial leverage. It's advisable to close some existing loans before applying for new ones.",
+    ),
+    'overall_risk': (
+        "Overall Profile Risk",
+        "While individual factors may be acceptable, your overall profile combination is assessed as high-risk by the model. Improving your CIBIL score is the most effective way to boost your eligibility.",
+    ),
+}
+
+APPROVAL_SUGGESTIONS = (
+    "Continue paying all your bills and EMIs on time without fail.",
+    "Keep your credit utilization ratio low (ideally below 30%).",
+    "Avoid applying for multiple new loans or credit cards in a short period.",
+    "Regularly review your full credit report for any errors.",
+)
+
+def get_rejection_analysis_and_suggestions(inputs: dict) -> tuple[tuple, tuple]:
     """Analyzes user inputs to provide reasons for ineligibility and actionable suggestions."""
-    reasons = []
-    suggestions = []
-    
-    if inputs['cibil'] < 650:
-        reasons.append("Low CIBIL Score")
-        suggestions.append("Improve your CIBIL score by paying all existing bills and EMIs on time without any delays.")
-        
-    annual_emi = inputs['annuity'] * 12
-    dti_ratio = (annual_emi / inputs['income']) if inputs['income'] > 0 else 1
+    cibil, income, annuity, emp = inputs['cibil'], inputs['income'], inputs['annuity'], inputs['emp']
+    dti_ratio = (annuity * 12 / income) if income > 0 else 1
     
-    if dti_ratio > 0.5:
-        reasons.append("High Debt-to-Income Ratio")
-        suggestions.append("The proposed monthly payment is high for your current income. Consider reducing the loan amount or extending the loan tenure to lower the EMI.")
-        
-    if inputs['emp'] < 1:
-        reasons.append("Short Employment History")
-        suggestions.append("Lenders prefer applicants with a stable employment history of at least 1-2 years. Building a longer track record at your current job will help.")
-        
-    if inputs.get('has_prev_loans'):
-        if inputs.get('prev_loan_count', 0) > 3:
-            reasons.append("High Number of Existing Loans")
-            suggestions.append("Having multiple active loans can indicate high financial leverage. It's advisable to close some existing loans before applying for new ones.")
-
-    if not reasons:
-        reasons.append("Overall Profile Risk")
-        suggestions.append("While individual factors may be acceptable, your overall profile combination is assessed as high-risk by the model. Improving your CIBIL score is the most effective way to boost your eligibility.")
+    matched = [
+        REASON_TEMPLATES[name] for name, applies in (
+            ('low_cibil', cibil < 650),
+            ('high_dti', dti_ratio > 0.5),
+            ('short_employment', emp < 1),
+            ('many_loans', inputs.get('has_prev_loans') and inputs.get('prev_loan_count', 0) > 3),
+        ) if applies
+    ] or [REASON_TEMPLATES['overall_risk']]
         
+    reasons, suggestions = zip(*matched)
     return reasons, suggestions
 
-def get_approval_suggestions() -> list:
+def get_approval_suggestions() -> tuple:
     """Provides suggestions for maintaining a good credit score."""
-    return [
-        "Continue paying all your bills and EMIs on time without fail.",
-        "Keep your credit utilization ratio low (ideally below 30%).",
-        "Avoid applying for multiple new loans or credit cards in a short period.",
-        "Regularly review your full credit report for any errors."
-    ]
+    return APPROVAL_SUGGESTIONS
 
-def map_to_full_payload(inputs: dict) -> dict:
-    """Creates the full data payload required by the model from a dictionary of user inputs."""
-    base = {col: 0 for col in training_columns}
-    
-    # The model was trained on 'EXT_SOURCE_2'. We must use that exact name here.
-    base['EXT_SOURCE_2'] = (inputs['cibil'] - 300) / 600
-    
-    base["DAYS_BIRTH"] = -inputs['age'] * 365
-    base["DAYS_EMPLOYED"] = -inputs['emp'] * 365
-    base['AMT_INCOME_TOTAL'] = inputs['income']
-    base['AMT_CREDIT'] = inputs['loan_amount']
-    base['AMT_ANNUITY'] = inputs['annuity']
-    
+def map_to_full_payload(inputs: dict) -> np.ndarray:
+    """Creates the full feature vector required by the model, in training-column order, from the user inputs."""
+    features = [
+        # The model was trained on 'EXT_SOURCE_2'. We must use that exact name here.
+        ('EXT_SOURCE_2', (inputs['cibil'] - 300) / 600),
+        ("DAYS_BIRTH", -inputs['age'] * 365),
+        ("DAYS_EMPLOYED", -inputs['emp'] * 365),
+        ('AMT_INCOME_TOTAL', inputs['income']),
+        ('AMT_CREDIT', inputs['loan_amount']),
+        ('AMT_ANNUITY', inputs['annuity']),
+    ]
     if inputs.get('has_prev_loans'):
         # Note: These feature names are placeholders. Your model needs to have been trained on them.
-        if 'PREV_LOAN_COUNT' in base: base['PREV_LOAN_COUNT'] = inputs.get('prev_loan_count', 0)
-        if 'PREV_AMT_OUTSTANDING' in base: base['PREV_AMT_OUTSTANDING'] = inputs.get('prev_outstanding_amt', 0)
-        if 'PREV_REMAINING_EMI' in base: base['PREV_REMAINING_EMI'] = inputs.get('prev_remaining_emi', 0)
-        
-    return base
+        features += [
+            ('PREV_LOAN_COUNT', inputs.get('prev_loan_count', 0)),
+            ('PREV_AMT_OUTSTANDING', inputs.get('prev_outstanding_amt', 0)),
+            ('PREV_REMAINING_EMI', inputs.get('prev_remaining_emi', 0)),
+        ]
+
+    vec = np.zeros(len(training_columns), dtype=np.float32)
+    for name, value in features:
+        # Features the model was not trained on are left out, as the API would ignore them
+        if name in COL_IDX:
+            vec[COL_IDX[name]] = value
+    return vec
+
+@st.cache_data(max_entries=512, ttl=3600, show_spinner=False)
+def request_prediction(body: bytes) -> dict:
+    """Posts an encoded payload to the API; resubmitting identical inputs is answered from cache."""
+    response = get_client().post("/predict", content=body, headers={'Content-Type': 'application/json'})
+    response.raise_for_status()
+    return orjson.loads(response.content)
 
-def generate_pdf_report(score: int, prob: float, eligibility: str, reasons: list = [], suggestions: list = []) -> bytes:
+# PDF page layout (A4, 10 mm margins, 6 mm line height)
+PAGE_WIDTH, PAGE_HEIGHT = A4
+MARGIN = 10 * mm
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+LINE_HEIGHT = 6 * mm
+
+def generate_pdf_report(score: int, prob: float, eligibility: str, reasons: tuple = (), suggestions: tuple = ()) -> bytes:
     """Generates a comprehensive PDF report including analysis and suggestions."""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 16)
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    y = PAGE_HEIGHT - MARGIN
     
     # Report Header
-    pdf.set_fill_color(240, 240, 240)
-    pdf.cell(0, 12, "Credit Scoring & Eligibility Report", ln=True, align="C", fill=True)
-    pdf.ln(10)
+    pdf.saveState()
+    pdf.setFillColorRGB(240 / 255, 240 / 255, 240 / 255)
+    pdf.rect(MARGIN, y - 12 * mm, CONTENT_WIDTH, 12 * mm, stroke=0, fill=1)
+    pdf.restoreState()
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawCentredString(PAGE_WIDTH / 2, y - 8 * mm, "Credit Scoring & Eligibility Report")
+    y -= 22 * mm
     
     # Assessment Result Section
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "Assessment Result", ln=True)
-    pdf.set_font("Arial", "", 11)
-    pdf.multi_cell(0, 6, f"Predicted Credit Score: {score}")
-    pdf.multi_cell(0, 6, f"Eligibility Status: {eligibility}")
-    pdf.ln(5)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(MARGIN, y - 6 * mm, "Assessment Result")
+    y -= 8 * mm
+    text = pdf.beginText(MARGIN, y - 4.5 * mm)
+    text.setFont("Helvetica", 11, leading=LINE_HEIGHT)
+    text.textLine(f"Predicted Credit Score: {score}")
+    text.textLine(f"Eligibility Status: {eligibility}")
+    pdf.drawText(text)
+    y -= 2 * LINE_HEIGHT + 5 * mm
     
     # Analysis & Suggestions Sections
     if reasons or suggestions:
-        pdf.line(10, pdf.get_y(), 200, pdf.get_y())
-        pdf.ln(5)
+        pdf.line(MARGIN, y, PAGE_WIDTH - MARGIN, y)
+        y -= 5 * mm
 
     if reasons:
-        pdf.set_font("Arial", "B", 12)
-        pdf.set_text_color(220, 50, 50) # Red
-        pdf.cell(0, 8, "Key Factors for Ineligibility", ln=True)
-        pdf.set_font("Arial", "", 11)
-        pdf.set_text_color(0, 0, 0) # Black
-        for i, reason in enumerate(reasons, 1):
-            pdf.multi_cell(0, 6, f"{i}. {reason}")
-        pdf.ln(5)
+        pdf.saveState()
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.setFillColorRGB(220 / 255, 50 / 255, 50 / 255) # Red
+        pdf.drawString(MARGIN, y - 6 * mm, "Key Factors for Ineligibility")
+        pdf.restoreState()
+        y -= 8 * mm
+        y = _draw_numbered_list(pdf, y, reasons) - 5 * mm
 
     if suggestions:
         suggestion_title = "Suggestions for Improvement" if reasons else "Recommendations to Maintain Your Good Score"
-        pdf.set_font("Arial", "B", 12)
-        pdf.set_text_color(0, 100, 0) # Green
-        pdf.cell(0, 8, suggestion_title, ln=True)
-        pdf.set_font("Arial", "", 11)
-        pdf.set_text_color(0, 0, 0) # Black
-        for i, suggestion in enumerate(suggestions, 1):
-            pdf.multi_cell(0, 6, f"{i}. {suggestion}")
-        pdf.ln(5)
+        pdf.saveState()
+        pdf.setFont("Helvetica-Bold", 12)
+        pdf.setFillColorRGB(0, 100 / 255, 0) # Green
+        pdf.drawString(MARGIN, y - 6 * mm, suggestion_title)
+        pdf.restoreState()
+        y -= 8 * mm
+        y = _draw_numbered_list(pdf, y, suggestions) - 5 * mm
         
-    # Return the direct byte output from the library
-    return pdf.output(dest="S").encode("latin-1")
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+def _draw_numbered_list(pdf: canvas.Canvas, y: float, items: tuple) -> float:
+    """Draws items as a wrapped, numbered list in one text object and returns the y below it."""
+    lines = [
+        line
+        for i, item in enumerate(items, 1)
+        for line in simpleSplit(f"{i}. {item}", "Helvetica", 11, CONTENT_WIDTH)
+    ]
+    text = pdf.beginText(MARGIN, y - 4.5 * mm)
+    text.setFont("Helvetica", 11, leading=LINE_HEIGHT)
+    text.textLines(lines)
+    pdf.drawText(text)
+    return y - len(lines) * LINE_HEIGHT
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="Credit Scoring Dashboard", layout="wide", page_icon="💳")
@@ -186,15 +261,15 @@ if predict_button:
         'prev_remaining_emi': prev_remaining_emi
     }
     st.session_state.user_inputs = user_inputs
+    st.session_state.pdf_future = None
 
     with st.spinner("Analyzing profile..."):
         try:
-            full_payload = map_to_full_payload(user_inputs)
-            predict_url = f"{API_URL}/predict"
-            response = requests.post(predict_url, json=full_payload, timeout=30)
-            response.raise_for_status()
-            st.session_state.prediction_result = response.json()
-        except requests.RequestException as e:
+            # Features are sent positionally, in the same training-column order the API uses
+            full_payload = {'features': map_to_full_payload(user_inputs)}
+            body = orjson.dumps(full_payload, option=orjson.OPT_SERIALIZE_NUMPY)
+            st.session_state.prediction_result = request_prediction(body)
+        except (httpx.HTTPError, orjson.JSONDecodeError) as e:
             st.error(f"API Call Failed: {e}")
             st.session_state.prediction_result = None
 
@@ -204,21 +279,32 @@ if "prediction_result" in st.session_state and st.session_state.prediction_resul
     score = result['credit_score']
     prob = result['probability_of_default']
     
+    eligible = score >= 670
+    if eligible:
+        eligibility = "Eligible for Loan"
+        reasons, suggestions = (), get_approval_suggestions()
+    else:
+        eligibility = "Not Eligible for Loan"
+        reasons, suggestions = get_rejection_analysis_and_suggestions(st.session_state.user_inputs)
+
+    # Build the PDF in the background while the analysis below is rendered; it is kept
+    # in the session so later reruns reuse it until the next prediction.
+    if st.session_state.get("pdf_future") is None:
+        st.session_state.pdf_future = get_pdf_executor().submit(
+            generate_pdf_report, score, prob, eligibility, reasons, suggestions
+        )
+    
     st.success("Analysis Complete!")
     st.metric("Predicted Credit Score", score)
     
-    if score >= 670:
-        eligibility = "Eligible for Loan"
+    if eligible:
         st.success(f"✅ {eligibility}")
-        reasons, suggestions = [], get_approval_suggestions()
         st.subheader("Congratulations & Recommendations")
         st.info("Your financial profile is strong. Here are some tips to maintain your excellent credit score:")
         for suggestion in suggestions:
             st.markdown(f"- {suggestion}")
     else:
-        eligibility = "Not Eligible for Loan"
         st.error(f"❌ {eligibility}")
-        reasons, suggestions = get_rejection_analysis_and_suggestions(st.session_state.user_inputs)
         st.subheader("Detailed Analysis")
         st.warning("Our analysis indicates the following key factors impacted your score:")
         for reason in reasons:
@@ -228,7 +314,7 @@ if "prediction_result" in st.session_state and st.session_state.prediction_resul
         for suggestion in suggestions:
             st.markdown(f"- {suggestion}")
 
-    pdf_bytes = generate_pdf_report(score, prob, eligibility, reasons, suggestions)
+    pdf_bytes = st.session_state.pdf_future.result()
     st.download_button(
         label="📄 Download Full Report as PDF",
         data=pdf_bytes,
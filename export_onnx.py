@@ -0,0 +1,35 @@
+"""Exports the LightGBM model, with the scaler built in, to ONNX for serving with ONNX Runtime.
+
+Run from the project folder after retraining: python export_onnx.py
+"""
+import numpy as np
+import onnxmltools
+from onnx import helper, numpy_helper
+from onnxmltools.convert.common.data_types import FloatTensorType
+
+import app
+
+if app.booster is None:
+    raise SystemExit("🔴 Model assets failed to load; nothing to export.")
+
+# ONNX tree ensembles store thresholds as float32. Many training values sit exactly on
+# the column mean, right next to a split, so the scaler-folded thresholds used by the
+# LightGBM path would round onto the wrong side. The ONNX graph instead standardises its
+# input first and runs the original trees, whose thresholds lie in the scaled space.
+# zipmap=False keeps 'probabilities' a plain (N, 2) tensor instead of a list of dicts.
+onnx_model = onnxmltools.convert_lightgbm(
+    app.model.booster_,
+    initial_types=[('scaled_input', FloatTensorType([None, app.N_COLS]))],
+    zipmap=False,
+)
+graph = onnx_model.graph
+graph.input[0].name = 'input'
+graph.initializer.extend([
+    numpy_helper.from_array(np.asarray(app.scaler.mean_, dtype=np.float32), 'scaler_mean'),
+    numpy_helper.from_array((1.0 / np.asarray(app.scaler.scale_)).astype(np.float32), 'scaler_inv_scale'),
+])
+graph.node.insert(0, helper.make_node('Sub', ['input', 'scaler_mean'], ['centered_input']))
+graph.node.insert(1, helper.make_node('Mul', ['centered_input', 'scaler_inv_scale'], ['scaled_input']))
+
+onnxmltools.utils.save_model(onnx_model, app.ONNX_MODEL_PATH)
+print(f"✅ ONNX model written to '{app.ONNX_MODEL_PATH}'.")
@@ -0,0 +1,12 @@
+import os
+
+# Serve with: gunicorn app:app (this file is picked up automatically)
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# Load the model assets once in the master; workers share them copy-on-write.
+preload_app = True
+
+workers = int(os.environ.get('WEB_CONCURRENCY', os.cpu_count() or 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = 60